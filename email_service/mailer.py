@@ -0,0 +1,257 @@
+import time
+import heapq
+import queue
+import smtplib
+import itertools
+import logging
+import threading
+from dataclasses import dataclass
+from email.mime.text import MIMEText
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from jinja2 import Environment, FileSystemLoader, Template
+
+logger = logging.getLogger("email_service")
+
+class TemplateRegistry:
+    """
+    Compiles every template in the directory once and keeps them in memory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self.env = Environment(loader=FileSystemLoader(str(self.directory)))
+        self._templates: Dict[str, Template] = {}
+        for path in self.directory.glob("*.html"):
+            self._templates[path.stem] = self.env.get_template(path.name)
+
+    def get(self, name: str) -> Template:
+        template = self._templates.get(name)
+        if template is None:
+            # Templates added after startup are compiled on first use
+            template = self.env.get_template(name + ".html")
+            self._templates[name] = template
+        return template
+
+    def render(self, name: str, variables: dict) -> str:
+        return self.get(name).render(**variables)
+
+@dataclass
+class OutgoingEmail:
+    id: str
+    to: str
+    subject: str
+    html: str
+    attempts: int = 0
+
+    def to_message(self, sender: str) -> MIMEText:
+        msg = MIMEText(self.html, "html")
+        msg["Subject"] = self.subject
+        msg["From"] = sender
+        msg["To"] = self.to
+        return msg
+
+class SMTPConnection:
+    """
+    A persistent SMTP connection that reconnects when the server dropped it.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = 10, max_idle: float = 30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+
+    def _connect(self) -> smtplib.SMTP:
+        self.close()
+        self._smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        return self._smtp
+
+    def _get(self) -> smtplib.SMTP:
+        if self._smtp is None:
+            return self._connect()
+        if time.monotonic() - self._last_used > self.max_idle:
+            # Servers drop idle sessions, check before reusing
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            return self._connect()
+        return self._smtp
+
+    def send(self, message: MIMEText):
+        smtp = self._get()
+        try:
+            smtp.send_message(message)
+        except smtplib.SMTPException as e:
+            # SMTPException is an OSError too, only a dropped session is worth a reconnect
+            if not isinstance(e, smtplib.SMTPServerDisconnected):
+                raise
+            self._connect().send_message(message)
+        except OSError:
+            # The socket died between messages, retry once on a fresh session
+            self._connect().send_message(message)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+class _DelayQueue:
+    """
+    Thread-safe queue of items that become available at a due time,
+    served in due time order and then insertion order. Once closed, get
+    returns None when nothing is left, pending items are still served.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, object]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item, due: float = 0.0):
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._seq), item))
+            self._cond.notify()
+
+    def get(self, block: bool = True):
+        with self._cond:
+            while True:
+                timeout = None
+                if self._heap:
+                    timeout = self._heap[0][0] - time.monotonic()
+                    if timeout <= 0:
+                        return heapq.heappop(self._heap)[2]
+                elif self._closed:
+                    return None
+                if not block:
+                    raise queue.Empty
+                self._cond.wait(timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def qsize(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+class MailQueue:
+    """
+    Background delivery of emails.
+
+    Each worker thread owns one persistent SMTP connection and sends messages
+    in batches of up to batch_size over it. Temporary failures are put back
+    on the queue with an exponential backoff, up to max_retries times.
+    Permanent 5xx rejections are not retried.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        sender: str,
+        workers: int = 2,
+        batch_size: int = 20,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sent = 0
+        self.failed = 0
+        self._stats_lock = threading.Lock()
+        self._queue = _DelayQueue()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"mail-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10):
+        """
+        Delivers what is already queued, retries included, then stops the workers.
+        """
+        self._queue.close()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def submit(self, email: OutgoingEmail):
+        self._queue.put(email)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "sent": self.sent, "failed": self.failed}
+
+    def _next_batch(self) -> Optional[List[OutgoingEmail]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                email = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if email is None:
+                break
+            batch.append(email)
+        return batch
+
+    def _run(self):
+        connection = SMTPConnection(self.host, self.port)
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                for email in batch:
+                    self._deliver(connection, email)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _is_permanent(error: Exception) -> bool:
+        # A 5xx reply (unknown recipient, rejected content) will not change on retry
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return True
+        return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+    def _deliver(self, connection: SMTPConnection, email: OutgoingEmail):
+        email.attempts += 1
+        try:
+            connection.send(email.to_message(self.sender))
+        except (smtplib.SMTPException, OSError) as e:
+            if self._is_permanent(e) or email.attempts > self.max_retries:
+                logger.error(f"Giving up on email {email.id} to {email.to}: {e}")
+                with self._stats_lock:
+                    self.failed += 1
+                return
+            delay = self.backoff * 2 ** (email.attempts - 1)
+            logger.warning(f"Sending email {email.id} failed ({e}), retrying in {delay:.1f}s")
+            if not isinstance(e, smtplib.SMTPResponseException):
+                connection.close()
+            # Requeue instead of sleeping so the rest of the batch goes out meanwhile
+            self._queue.put(email, due=time.monotonic() + delay)
+            return
+        with self._stats_lock:
+            self.sent += 1
@@ -1,12 +1,27 @@
-from fastapi import FastAPI
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import List
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from jinja2 import Environment, FileSystemLoader
-import smtplib
-from email.mime.text import MIMEText
+from jinja2 import TemplateNotFound
+from mailer import MailQueue, OutgoingEmail, TemplateRegistry
 
-app = FastAPI()
+SMTP_HOST = os.getenv("SMTP_HOST", "maildev")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "1025"))
+MAIL_FROM = os.getenv("MAIL_FROM", "IOT@example.com")
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
 
-env = Environment(loader=FileSystemLoader("templates"))
+templates = TemplateRegistry("templates")
+mail_queue = MailQueue(SMTP_HOST, SMTP_PORT, MAIL_FROM, workers=MAIL_WORKERS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    mail_queue.start()
+    yield
+    mail_queue.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 class EmailRequest(BaseModel):
     to: str
@@ -14,17 +29,31 @@ class EmailRequest(BaseModel):
     template: str
     variables: dict
 
+class BatchEmailRequest(BaseModel):
+    emails: List[EmailRequest]
+
+def _render(req: EmailRequest) -> OutgoingEmail:
+    try:
+        html = templates.render(req.template, req.variables)
+    except TemplateNotFound:
+        raise HTTPException(status_code=404, detail=f"Template '{req.template}' not found")
+    return OutgoingEmail(id=uuid.uuid4().hex, to=req.to, subject=req.subject, html=html)
+
 @app.post("/send")
 def send_email(req: EmailRequest):
-    template = env.get_template(req.template + ".html")
-    html = template.render(**req.variables)
-
-    msg = MIMEText(html, "html")
-    msg["Subject"] = req.subject
-    msg["From"] = "IOT@example.com"
-    msg["To"] = req.to
+    # Delivery happens in the background over a pooled SMTP connection
+    email = _render(req)
+    mail_queue.submit(email)
+    return {"status": "queued", "id": email.id}
 
-    with smtplib.SMTP("maildev", 1025) as server:
-        server.send_message(msg)
+@app.post("/send/batch")
+def send_batch(req: BatchEmailRequest):
+    # Render everything first so one bad template rejects the batch before anything is queued
+    emails = [_render(r) for r in req.emails]
+    for email in emails:
+        mail_queue.submit(email)
+    return {"status": "queued", "ids": [email.id for email in emails]}
 
-    return {"status": "ok"}
+@app.get("/queue")
+def queue_status():
+    return mail_queue.stats()
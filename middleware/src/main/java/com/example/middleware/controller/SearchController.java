@@ -58,6 +58,9 @@ public class SearchController {
         Map<String, Object> payload = new HashMap<>();
         payload.put("input", req.getInput());
         payload.put("search_depth", req.getSearchDepth());
+        if (req.getJobId() != null) {
+            payload.put("job_id", req.getJobId());
+        }
         DownstreamService.DownstreamResult result;
         try {
             result = downstreamService.callDownstream(downstreamUrl, payload);
@@ -1,12 +1,14 @@
 import os
+import asyncio
 import logging
+import threading
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 import torch
-from nlp import NLP_Pipeline, get_site_data
+from nlp import NLP_Pipeline, PipelineCancelled, get_site_data, SingleFlight, CallCancelled, AdmissionController, Overloaded
 from newspaper import Article
 
 # Load env variables
@@ -16,8 +18,25 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("NLP_Service")
 
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "60"))
+NLP_MAX_CONCURRENCY = int(os.getenv("NLP_MAX_CONCURRENCY", "1"))
+NLP_MAX_QUEUE = int(os.getenv("NLP_MAX_QUEUE", "32"))
+NLP_MAX_WAIT = {
+    "interactive": float(os.getenv("NLP_MAX_WAIT_INTERACTIVE", "30")),
+    "bulk": float(os.getenv("NLP_MAX_WAIT_BULK", "120")),
+    "batch": float(os.getenv("NLP_MAX_WAIT_BATCH", "600")),
+}
+
 ml_models = {}
 
+# Identical concurrent /process calls share one pipeline run and a short-lived result
+# Work is cancelled once every request attached to it has been cancelled
+inflight_requests = SingleFlight(ttl=RESULT_CACHE_TTL, cancel_abandoned=True)
+# Cancel signals of running /process calls, by caller supplied request_id
+request_cancels: Dict[str, asyncio.Event] = {}
+# Bounded priority queue in front of the model, sheds load instead of letting every request slow down
+admission = AdmissionController(NLP_MAX_CONCURRENCY, NLP_MAX_QUEUE, NLP_MAX_WAIT)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Initializing NLP Service...")
@@ -44,14 +63,23 @@ class ProcessRequest(BaseModel):
     is_article: bool = False 
     top_x: int = 5
     query_variations: int = 1
+    priority: str = "bulk"             # interactive, bulk or batch
+    request_id: Optional[str] = None   # Lets the caller cancel the request with /cancel/{request_id}
 
 # --- Endpoints ---
 @app.get("/health")
 def health_check():
     return {"status": "ok", "gpu_available": torch.cuda.is_available()}
 
+@app.get("/queue")
+def queue_status():
+    """
+    Queue depth and concurrency, polled by the autoscaler.
+    """
+    return admission.stats()
+
 @app.post("/process")
-def process_content(data: ProcessRequest):
+async def process_content(data: ProcessRequest):
     """
     Accepts text OR url, runs NLP, returns search queries.
     """
@@ -59,6 +87,57 @@ def process_content(data: ProcessRequest):
     if not nlp_pipe:
         raise HTTPException(status_code=503, detail="NLP Model not ready")
 
+    if not data.article_url and not data.content:
+        raise HTTPException(status_code=400, detail="Must provide 'content' or 'article_url'")
+
+    key = (
+        (data.article_url or "").strip(),
+        " ".join((data.content or "").split()),
+        data.is_article,
+        data.top_x,
+        data.query_variations,
+        # Joined requests wait at the first caller's queue position, so only coalesce within a priority
+        data.priority,
+    )
+    cancel = None
+    if data.request_id:
+        cancel = request_cancels.setdefault(data.request_id, asyncio.Event())
+    try:
+        return await inflight_requests.do(key, lambda: _admit_pipeline(nlp_pipe, data), cancel=cancel)
+    except Overloaded as e:
+        logger.warning(f"Shedding {data.priority} request: {e}")
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except CallCancelled:
+        raise HTTPException(status_code=409, detail="Request cancelled")
+    finally:
+        if data.request_id:
+            request_cancels.pop(data.request_id, None)
+
+@app.post("/cancel/{request_id}")
+def cancel_request(request_id: str):
+    """
+    Cancels a /process call sent with this request_id. The pipeline stops
+    once no other identical request is waiting on it.
+    """
+    cancel = request_cancels.get(request_id)
+    if cancel is None:
+        return {"status": "not_found"}
+    cancel.set()
+    return {"status": "cancelled"}
+
+async def _admit_pipeline(nlp_pipe: NLP_Pipeline, data: ProcessRequest) -> Dict[str, Any]:
+    stop = threading.Event()
+    async with admission.slot(data.priority):
+        work = asyncio.ensure_future(asyncio.to_thread(_run_pipeline, nlp_pipe, data, stop))
+        try:
+            return await asyncio.shield(work)
+        except asyncio.CancelledError:
+            # Keep the slot until the pipeline reaches its next stop check, the model is still busy until then
+            stop.set()
+            await asyncio.gather(work, return_exceptions=True)
+            raise
+
+def _run_pipeline(nlp_pipe: NLP_Pipeline, data: ProcessRequest, stop: threading.Event) -> Dict[str, Any]:
     try:
         # From /link/all
         if data.article_url:
@@ -69,26 +148,26 @@ def process_content(data: ProcessRequest):
             queries = nlp_pipe.execute_pipeline(
                 article, 
                 top_x=data.top_x, 
-                query_variations=data.query_variations
+                query_variations=data.query_variations,
+                should_stop=stop.is_set
             )
             # Return detected lang so Web Service knows which market to use
             return {"queries": queries, "detected_lang": lang}
 
         # From /text/all
-        elif data.content:
-            if data.is_article:
-                dummy_article = Article("") 
-                dummy_article.set_text(data.content)
-                dummy_article.set_summary(data.content) 
-                queries = nlp_pipe.execute_pipeline(dummy_article, top_x=data.top_x, query_variations=data.query_variations)
-            else:
-                queries = nlp_pipe.execute_pipeline(data.content, top_x=data.top_x, query_variations=data.query_variations)
-            
-            return {"queries": queries, "detected_lang": "en"}
-
+        if data.is_article:
+            dummy_article = Article("") 
+            dummy_article.set_text(data.content)
+            dummy_article.set_summary(data.content) 
+            queries = nlp_pipe.execute_pipeline(dummy_article, top_x=data.top_x, query_variations=data.query_variations, should_stop=stop.is_set)
         else:
-            raise HTTPException(status_code=400, detail="Must provide 'content' or 'article_url'")
+            queries = nlp_pipe.execute_pipeline(data.content, top_x=data.top_x, query_variations=data.query_variations, should_stop=stop.is_set)
+        
+        return {"queries": queries, "detected_lang": "en"}
 
+    except PipelineCancelled:
+        logger.info("NLP pipeline cancelled")
+        raise
     except Exception as e:
         logger.error(f"NLP Processing Error: {e}")
         raise HTTPException(status_code=500, detail=f"NLP Error: {str(e)}")
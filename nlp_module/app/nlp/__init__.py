@@ -1,2 +1,5 @@
-from .pipeline import NLP_Pipeline, nlp_article
-from .sitecontent import get_site_data
\ No newline at end of file
+from .pipeline import NLP_Pipeline, PipelineCancelled, nlp_article
+from .sitecontent import get_site_data
+from .singleflight import SingleFlight, CallCancelled
+from .admission import AdmissionController, Overloaded
+from .language import detect_language, detect_languages
\ No newline at end of file
@@ -0,0 +1,146 @@
+import time
+import heapq
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Lower rank is served first
+PRIORITIES = {"interactive": 0, "bulk": 1, "batch": 2}
+_PRIORITY_NAMES = {rank: name for name, rank in PRIORITIES.items()}
+
+class Overloaded(Exception):
+    """
+    Raised when a request is shed instead of queued.
+    status_code is 429 when the queue is full and 503 when the expected or
+    actual queue time exceeds the limit for the request's priority.
+    """
+    def __init__(self, status_code: int, retry_after: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    Bounded priority queue in front of the model.
+
+    At most max_concurrency requests run at once; up to max_queue more wait,
+    served by priority and then arrival order. When the queue is full, the
+    newest waiter of a lower priority is shed to make room, and requests are
+    rejected up front when there is none, or when the estimated wait, counting only the active
+    requests and the waiters served before them, exceeds their priority's
+    max_wait, and dropped if they actually wait longer than that.
+    """
+
+    def __init__(self, max_concurrency: int = 1, max_queue: int = 32, max_wait: Optional[Dict[str, float]] = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait or {"interactive": 30.0, "bulk": 120.0, "batch": 600.0}
+        self._active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued: Dict[str, int] = {name: 0 for name in PRIORITIES}
+        self._seq = itertools.count()
+        # Exponentially weighted average of how long one request holds a slot
+        self._service_time = 10.0
+
+    @property
+    def depth(self) -> int:
+        return sum(self._queued.values())
+
+    def queued_ahead(self, priority: Optional[str] = None) -> int:
+        """
+        Number of queued requests served before a new one of this priority,
+        all of them when no priority is given.
+        """
+        if priority is None:
+            return self.depth
+        rank = PRIORITIES[priority]
+        return sum(count for name, count in self._queued.items() if PRIORITIES[name] <= rank)
+
+    def estimated_wait(self, priority: Optional[str] = None) -> float:
+        # Lower priorities queued behind the request do not delay it
+        return (self.queued_ahead(priority) + 1) * self._service_time / self.max_concurrency
+
+    def _retry_after(self, priority: Optional[str] = None) -> int:
+        return max(1, int(self.estimated_wait(priority)))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "queue_depth": self.depth,
+            "queued_by_priority": dict(self._queued),
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "estimated_wait_sec": round(self.estimated_wait(), 2),
+        }
+
+    async def acquire(self, priority: str):
+        if priority not in PRIORITIES:
+            priority = "bulk"
+
+        if self._active < self.max_concurrency and not self.depth:
+            self._active += 1
+            return
+
+        if self.depth >= self.max_queue and not self._shed_lower(PRIORITIES[priority]):
+            # Everything queued is served first, so the whole backlog is the wait
+            raise Overloaded(429, self._retry_after(), "NLP queue is full")
+
+        max_wait = self.max_wait[priority]
+        if self.estimated_wait(priority) > max_wait:
+            raise Overloaded(503, self._retry_after(priority), f"Expected queue time exceeds {max_wait:.0f}s")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (PRIORITIES[priority], next(self._seq), future))
+        self._queued[priority] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled() and future.exception() is not None:
+                # Shed just as we gave up, _shed_lower already took us off the count
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                raise future.exception()
+            self._queued[priority] -= 1
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up, pass it on
+                self.release()
+            else:
+                future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise Overloaded(503, self._retry_after(priority), f"Queued for more than {max_wait:.0f}s")
+        self._queued[priority] -= 1
+
+    def _shed_lower(self, rank: int) -> bool:
+        """
+        Fails the newest waiter of a lower priority than rank with a 429 to
+        make room. Returns False when there is none.
+        """
+        victims = [entry for entry in self._waiters if entry[0] > rank and not entry[2].done()]
+        if not victims:
+            return False
+        victim_rank, _, future = max(victims, key=lambda entry: (entry[0], entry[1]))
+        self._queued[_PRIORITY_NAMES[victim_rank]] -= 1
+        future.set_exception(Overloaded(429, self._retry_after(), "Shed for a higher priority request"))
+        return True
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter, _active stays the same
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: str):
+        await self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            self.release()
@@ -0,0 +1,83 @@
+from functools import lru_cache
+from typing import List, Optional
+import numpy as np
+from langid.langid import LanguageIdentifier, model as LANGID_MODEL
+
+# Long inputs are sampled from the start, middle and end of the text
+MAX_CHARS = 3000
+# Inputs up to this length (titles, short queries) are memoized
+SHORT_TEXT_LEN = 256
+CACHE_SIZE = 8192
+# Short inputs (titles, short queries) often look like another language to langid,
+# they only get a label when the model is this confident, None otherwise
+CONFIDENT_LEN = 200
+MIN_SHORT_CONFIDENCE = 0.99
+
+_identifier: Optional[LanguageIdentifier] = None
+
+def _get_identifier() -> LanguageIdentifier:
+    # The model is decoded once per process, on first use
+    global _identifier
+    if _identifier is None:
+        _identifier = LanguageIdentifier.from_modelstring(LANGID_MODEL, norm_probs=True)
+    return _identifier
+
+def _sample(text: str) -> str:
+    text = text.strip()
+    if len(text) <= MAX_CHARS:
+        return text
+    window = MAX_CHARS // 3
+    middle = len(text) // 2 - window // 2
+    return " ".join((text[:window], text[middle:middle + window], text[-window:]))
+
+def _has_letters(text: str) -> bool:
+    return any(c.isalpha() for c in text)
+
+def _label(text: str, lang: str, confidence: float) -> Optional[str]:
+    if len(text) < CONFIDENT_LEN and confidence < MIN_SHORT_CONFIDENCE:
+        return None
+    return lang
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _detect_short(text: str) -> Optional[str]:
+    return _label(text, *_get_identifier().classify(text))
+
+def detect_language(text: Optional[str]) -> Optional[str]:
+    """
+    Returns the ISO 639-1 code of the text's language, or None when the text
+    has nothing to classify or is too short to tell confidently.
+    Deterministic, unlike langdetect.
+    """
+    if not text or not _has_letters(text):
+        return None
+    text = _sample(text)
+    if len(text) <= SHORT_TEXT_LEN:
+        return _detect_short(text)
+    return _label(text, *_get_identifier().classify(text))
+
+def detect_languages(texts: List[Optional[str]]) -> List[Optional[str]]:
+    """
+    Classifies many texts at once, e.g. all titles of a SERP page.
+    Repeated texts are classified once and all of them are scored with a
+    single matrix product against the model.
+    """
+    results: List[Optional[str]] = [None] * len(texts)
+    pending = {}
+    for i, text in enumerate(texts):
+        if not text or not _has_letters(text):
+            continue
+        text = _sample(text)
+        pending.setdefault(text, []).append(i)
+
+    identifier = _get_identifier()
+    if pending:
+        samples = list(pending)
+        features = np.vstack([identifier.instance2fv(t) for t in samples])
+        scores = features.dot(identifier.nb_ptc) + identifier.nb_pc
+        # Normalized probability of the best class, as norm_probs computes it
+        confidences = 1.0 / np.exp(scores - scores.max(axis=1, keepdims=True)).sum(axis=1)
+        for text, best, confidence in zip(samples, scores.argmax(axis=1), confidences):
+            lang = _label(text, str(identifier.nb_classes[best]), float(confidence))
+            for i in pending[text]:
+                results[i] = lang
+    return results
@@ -6,7 +6,14 @@ import spacy
 import nltk
 nltk.download('punkt_tab')
 from newspaper import Article
-from typing import List, Tuple, Dict
+from typing import Callable, List, Optional, Tuple, Dict
+
+class PipelineCancelled(Exception):
+    """Raised between LLM calls when the caller asked the pipeline to stop."""
+
+def _check_stop(should_stop: Optional[Callable[[], bool]]):
+    if should_stop is not None and should_stop():
+        raise PipelineCancelled("Pipeline cancelled")
 
 class Local_LLM():
     def __init__(self, model="Qwen/Qwen3-4B-Instruct-2507", device="cuda", task="text-generation"):
@@ -107,7 +114,7 @@ class NLP_Pipeline():
         
         return answer        
 
-    def process_raw_text(self,input_text:str, top_x:int = 5) -> List[dict]:
+    def process_raw_text(self,input_text:str, top_x:int = 5, should_stop: Optional[Callable[[], bool]] = None) -> List[dict]:
         """
         Given an input text, breaks it up into sentences, then ranks these based on how important these are.
         The top_x most important sentences will then be passed to an LLM that transforms them into a websearch style phrase.
@@ -124,18 +131,20 @@ class NLP_Pipeline():
         processed_sentences = [] 
         
         for sentence_text in sentences:
+            _check_stop(should_stop)
             sentence_dict = {"sentence": sentence_text}
             sentence_dict["search_term"] = self.generate_search_term(sentence_text)
             processed_sentences.append(sentence_dict)
             
         return processed_sentences
 
-    def process_article(self, article:Article) -> List[dict]:
+    def process_article(self, article:Article, should_stop: Optional[Callable[[], bool]] = None) -> List[dict]:
         article = nlp_article(article)
         importants = self.split_into_sentences(article.summary)
         processed_sentences = []
         
         for sentence in importants:
+            _check_stop(should_stop)
             search_term = self.generate_search_term(sentence)
             processed_sentences.append({
                 "sentence": sentence, 
@@ -144,15 +153,19 @@ class NLP_Pipeline():
             
         return processed_sentences
 
-    def execute_pipeline(self, input, top_x:int=5, query_variations:int=1, do_ner=True) -> List[dict]:
+    def execute_pipeline(self, input, top_x:int=5, query_variations:int=1, do_ner=True, should_stop: Optional[Callable[[], bool]] = None) -> List[dict]:
+        """
+        should_stop is polled between LLM calls, PipelineCancelled is raised once it returns True.
+        """
         searchterms = None
         entities = None
         
         if isinstance(input, Article):
-            searchterms = self.process_article(input)
+            searchterms = self.process_article(input, should_stop)
         else:
-            searchterms = self.process_raw_text(input, top_x)
+            searchterms = self.process_raw_text(input, top_x, should_stop)
         
+        _check_stop(should_stop)
         if do_ner:
             if isinstance(input, Article):
                 entities = self.find_entities(input.text)
@@ -170,6 +183,7 @@ class NLP_Pipeline():
 
         res = []
         for query in searchterms:
+            _check_stop(should_stop)
             res.append(query)
             variations = self.query_variations(query["search_term"], query_variations)
             for var in variations:
@@ -1,10 +1,8 @@
 from newspaper import Article
 from typing import Tuple
-from langdetect import detect, DetectorFactory
 # Using stealthsession to avoid detection because download is not working anymore
 from stealth_requests import StealthSession 
-
-DetectorFactory.seed = 0
+from .language import detect_language
 
 def get_site_data(url: str) -> Tuple[Article, str]:
     print(f"Stealth downloading: {url}")
@@ -17,9 +15,6 @@ def get_site_data(url: str) -> Tuple[Article, str]:
     article.set_html(html_content)
     article.parse()
     
-    try:
-        lang = detect(article.text)
-    except:
-        lang = 'en'
+    lang = detect_language(article.text) or 'en'
         
     return article, lang
\ No newline at end of file
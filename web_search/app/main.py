@@ -1,16 +1,22 @@
 import os
 import json
+import uuid
 import asyncio
+import threading
 import requests
+import multiprocessing
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional, Tuple, Mapping, Callable, Awaitable
+from types import MappingProxyType
+from concurrent.futures import ProcessPoolExecutor
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from pathlib import Path
-from web import WebScraping 
-from langdetect import detect
+from datetime import date
+from urllib.parse import urlsplit, urlunsplit
+from web import WebScraping, SingleFlight, CallCancelled, ResultDeduplicator, SharedStore, SearchJobs, JobExists, SearchResult, FINISHED_STATUSES, detect_language, dumps
 
 # Directory & Env
 BASE_DIR = Path(__file__).parent
@@ -19,28 +25,54 @@ load_dotenv()
 # Configurations
 NLP_SERVICE_URL = os.getenv("NLP_SERVICE_URL", "http://nlp-service:8080") 
 AUTH_TOKEN_NGROK = os.getenv("AUTH_TOKEN_NGROK")
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "60"))
+# Number of processes parsing SERP pages per worker, 0 parses in the request thread
+PARSE_PROCESSES = int(os.getenv("PARSE_PROCESSES", "0"))
+# SQLite file shared by all uvicorn workers on this host
+SHARED_STORE_PATH = os.getenv("SHARED_STORE_PATH", "/tmp/web_search_store.sqlite3")
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+JOB_POLL_INTERVAL = 0.5
 
-ml_models = {}
-MARKET_MAP = {}
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    print("Initializing Web Search Service...")
-    
-    ml_models["scraper"] = WebScraping()
-    
+def _load_market_map() -> Mapping[str, str]:
     market_map_path = BASE_DIR / "market_map.json"
     try:
         if market_map_path.exists():
             with open(market_map_path, "r") as f:
-                global MARKET_MAP
-                MARKET_MAP = json.load(f)
-            print(f"Loaded {len(MARKET_MAP)} markets.")
+                market_map = json.load(f)
+            print(f"Loaded {len(market_map)} markets.")
+            return MappingProxyType(market_map)
     except Exception as e:
         print(f"Warning: Could not load the market map: {e}")
+    return MappingProxyType({})
+
+# Loaded once per process at import and never modified
+MARKET_MAP = _load_market_map()
+
+ml_models = {}
+shared_store = SharedStore(SHARED_STORE_PATH)
+
+# Identical concurrent searches share one computation and a short-lived result,
+# the computation stops once every caller waiting on it has cancelled
+inflight_searches = SingleFlight(ttl=RESULT_CACHE_TTL, store=shared_store, cancel_abandoned=True)
+jobs = SearchJobs(shared_store, ttl=JOB_TTL)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print("Initializing Web Search Service...")
+
+    parse_pool = None
+    if PARSE_PROCESSES > 0:
+        # spawn, not fork: the worker already runs the event loop and thread pool
+        parse_pool = ProcessPoolExecutor(max_workers=PARSE_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        print(f"Parsing SERP pages in {PARSE_PROCESSES} processes.")
+
+    ml_models["scraper"] = WebScraping(parse_pool=parse_pool, store=shared_store)
+    ml_models["dedup"] = ResultDeduplicator()
 
     yield
     ml_models.clear()
+    if parse_pool is not None:
+        parse_pool.shutdown(cancel_futures=True)
 
 app = FastAPI(title="Web Search Gateway", lifespan=lifespan)
 
@@ -62,42 +94,200 @@ def _get_market_code(user_input: Optional[str]) -> Optional[str]:
     if not user_input: return None
     return MARKET_MAP.get(user_input.lower(), user_input)
 
+def _normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+def _call_nlp(payload: Dict[str, Any]) -> Dict[str, Any]:
+    response = requests.post(f"{NLP_SERVICE_URL}/process", json=payload)
+    if response.status_code in (429, 503):
+        # Pass load shedding through so clients back off instead of seeing a 500
+        retry_after = response.headers.get("Retry-After", "5")
+        raise HTTPException(status_code=response.status_code, detail="NLP Service overloaded", headers={"Retry-After": retry_after})
+    if response.status_code == 409:
+        # Cancelled in the NLP service, possibly by /cancel/{job_id} on another worker
+        raise HTTPException(status_code=409, detail="NLP request cancelled")
+    response.raise_for_status()
+    return response.json()
+
+def _cancel_nlp(request_id: str):
+    try:
+        requests.post(f"{NLP_SERVICE_URL}/cancel/{request_id}", timeout=3)
+    except Exception as e:
+        print(f"Warning: Could not cancel NLP request {request_id}: {e}")
+
+async def _search_queries(
+    scraper: WebScraping,
+    queries: List[Dict[str, Any]],
+    search_depth: int,
+    market: Optional[str],
+    on_query_done: Optional[Callable[[Dict[str, Any]], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None
+) -> Tuple[Optional[SearchResult], List[Dict[str, Any]]]:
+    all_dated_results = []
+
+    for query in queries:
+        # should_stop and on_query_done read and write the shared store, keep them off the event loop
+        if should_stop is not None and await asyncio.to_thread(should_stop):
+            break
+
+        term = query.get("search_term") 
+        entities = query.get("entities", [])
+        
+        results_with_dates, websites_without_dates = await asyncio.to_thread(
+            scraper.search_bing,
+            term,
+            entities=entities,
+            num_results=search_depth,
+            num_undated_target=search_depth,
+            market=market,
+            should_stop=should_stop
+        )
+
+        query["news_results"] = results_with_dates
+        query["website_results"] = websites_without_dates
+        all_dated_results.extend(results_with_dates)
+        if on_query_done is not None:
+            await asyncio.to_thread(on_query_done, query)
+
+    oldest = await asyncio.to_thread(scraper.get_oldest_result, all_dated_results)
+    # The same article (or syndicated copies of it) often shows up under several queries
+    clusters = await asyncio.to_thread(ml_models["dedup"].dedupe_queries, queries)
+    return oldest, clusters
+
 # --- Inputs ---
 class Input(BaseModel):
     input: str 
     search_depth: int
     market: Optional[str] = None
+    job_id: Optional[str] = None  # Lets the caller stop the search with /cancel/{job_id}
 
 class CombinedResponse(BaseModel):
     warning: Optional[str] = None
     result: List[Dict[str, Any]]
     oldest_result: Optional[Dict[str, Any]] = None
+    clusters: List[Dict[str, Any]] = []
+
+class Watermark(BaseModel):
+    newest_date: Optional[date] = None
+    known_urls: List[str] = []
+
+class IncrementalQuery(BaseModel):
+    # A search term generated by an earlier /link/all or /text/all call, other fields are passed through
+    model_config = {"extra": "allow"}
+    search_term: str = Field(min_length=1)
+    entities: List[Dict[str, Any]] = []
+
+class IncrementalInput(BaseModel):
+    queries: List[IncrementalQuery] = Field(min_length=1)
+    market: Optional[str] = None
+    watermark: Watermark = Watermark()
+    max_pages: int = Field(WebScraping.DEFAULT_INCREMENTAL_PAGES, ge=1, le=WebScraping.MAX_INCREMENTAL_PAGES)
+
+class IncrementalResponse(BaseModel):
+    result: List[Dict[str, Any]]
+    clusters: List[Dict[str, Any]] = []
+    new_results: int
+    watermark: Watermark
 
 # --- Endpoints ---
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
 
+# Responses are serialized once with orjson and returned as is, the body is what gets cached and shared.
+# CombinedResponse documents the shape but is not used to validate it.
 @app.post("/link/all", response_model=CombinedResponse)
 async def link_all(data: Input):
-    scraper = ml_models["scraper"]
+    key = ("link", _normalize_url(data.input), _get_market_code(data.market), data.search_depth)
+    body = await _coalesced_search("link", key, lambda: _run_search(_prepare_link, data), data)
+    return Response(content=body, media_type="application/json")
+
+async def _coalesced_search(kind: str, key: Tuple, fn: Callable[[], Awaitable[str]], data: Input) -> str:
+    """
+    Runs a /link/all or /text/all search through inflight_searches. A call with
+    a job_id is tracked as a job under that id (status only, no result), so
+    /cancel/{job_id} on any worker makes it leave the shared search with a 409.
+    The search itself only stops once every caller waiting on it has cancelled.
+    """
+    if not data.job_id:
+        return await inflight_searches.do(key, fn)
+
+    job_id = data.job_id
+    try:
+        await asyncio.to_thread(jobs.create, kind, data.model_dump(), job_id)
+    except JobExists:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is already running")
+    update = lambda **fields: asyncio.to_thread(jobs.update, job_id, **fields)
+    await update(status="running", stage="search")
+
+    cancel = asyncio.Event()
+    watcher = asyncio.create_task(_watch_cancel(job_id, cancel))
+    try:
+        body = await inflight_searches.do(key, fn, cancel=cancel)
+    except (CallCancelled, asyncio.CancelledError) as e:
+        await update(status="cancelled")
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        raise HTTPException(status_code=409, detail="Search cancelled")
+    except HTTPException as e:
+        await update(status="failed", error=e.detail, error_status=e.status_code)
+        raise
+    except Exception as e:
+        await update(status="failed", error=str(e))
+        raise
+    finally:
+        watcher.cancel()
+    await update(status="done", stage=None)
+    return body
+
+async def _watch_cancel(job_id: str, cancel: asyncio.Event):
+    # Any worker can set the cancel flag, poll it like the job stream does
+    while not await asyncio.to_thread(jobs.is_cancelled, job_id):
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+    cancel.set()
 
+async def _run_search(prepare: Callable, data: Input) -> str:
+    """
+    The computation shared by coalesced callers. When inflight_searches cancels
+    it, the NLP request and the scraping threads are stopped too.
+    """
+    request_id = uuid.uuid4().hex
+    stop = threading.Event()
+    try:
+        queries, market, search_depth, warning = await prepare(data, request_id=request_id)
+        oldest, clusters = await _search_queries(ml_models["scraper"], queries, search_depth, market, should_stop=stop.is_set)
+    except asyncio.CancelledError:
+        stop.set()
+        await asyncio.to_thread(_cancel_nlp, request_id)
+        raise
+    return dumps({"warning": warning, "result": queries, "oldest_result": oldest, "clusters": clusters}).decode()
+
+async def _prepare_link(data: Input, request_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str], int, Optional[str]]:
+    """
+    NLP step of /link/all, returns the queries, market, search depth and warning.
+    """
     try:
         payload = {
             "article_url": data.input,  # Send URL
             "is_article": True, 
             "top_x": 5, 
-            "query_variations": 1 
+            "query_variations": 1,
+            "priority": "bulk",
+            "request_id": request_id
         }
         
         # Call the GPU service
-        response = requests.post(f"{NLP_SERVICE_URL}/process", json=payload)
-        response.raise_for_status()
-        
-        resp_data = response.json()
+        resp_data = await asyncio.to_thread(_call_nlp, payload)
         queries = resp_data["queries"]
         detected_lang = resp_data.get("detected_lang", "en") 
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"NLP Service Error: {e}")
         if hasattr(e, 'response') and e.response is not None:
@@ -105,34 +295,20 @@ async def link_all(data: Input):
         raise HTTPException(status_code=500, detail=f"NLP Service Failed: {e}")
 
     final_market = _get_market_code(data.market) or _get_market_code(detected_lang)
-
-    all_dated_results = []
-
-    for query in queries:
-        term = query.get("search_term") 
-        entities = query.get("entities", [])
-        
-        results_with_dates, websites_without_dates = await asyncio.to_thread(
-            scraper.search_bing,
-            term,
-            entities=entities,
-            num_results=data.search_depth,
-            num_undated_target=data.search_depth,
-            market=final_market
-        )
-
-        query["news_results"] = results_with_dates
-        query["website_results"] = websites_without_dates
-        all_dated_results.extend(results_with_dates)
-
-    oldest = await asyncio.to_thread(scraper.get_oldest_result, all_dated_results)
-    return {"warning": None, "result": queries, "oldest_result": oldest}
+    return queries, final_market, data.search_depth, None
 
 
 @app.post("/text/all", response_model=CombinedResponse)
 async def text_all(data: Input):
-    scraper = ml_models["scraper"]
-    
+    # search_depth is derived from the input length below, so the text identifies the request
+    key = ("text", _normalize_text(data.input), _get_market_code(data.market))
+    body = await _coalesced_search("text", key, lambda: _run_search(_prepare_text, data), data)
+    return Response(content=body, media_type="application/json")
+
+async def _prepare_text(data: Input, request_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str], int, Optional[str]]:
+    """
+    NLP step of /text/all, returns the queries, market, search depth and warning.
+    """
     text_input = data.input.strip()
     words = text_input.split()
     warning_message = None
@@ -143,16 +319,13 @@ async def text_all(data: Input):
     if len(words) < 5: 
         warning_message = "Input is very short. Searching directly."
         queries = [{"search_term": text_input, "sentence": text_input}]
-        data.search_depth = 50
+        search_depth = 50
 
-        try:
-            original_lang = detect(text_input)
-        except:
-            original_lang = 'en'
+        original_lang = detect_language(text_input) or 'en'
             
     else:
         # If the sentence is long pass it to NLP service
-        data.search_depth = 5
+        search_depth = 5
         try:
             top_x = 1 if len(text_input.split('.')) <= 2 else 3
             
@@ -160,40 +333,172 @@ async def text_all(data: Input):
                 "content": text_input, 
                 "is_article": False, 
                 "top_x": top_x,
-                "query_variations": 1
+                "query_variations": 1,
+                "priority": "interactive",
+                "request_id": request_id
             }
-            response = requests.post(f"{NLP_SERVICE_URL}/process", json=payload)
-            response.raise_for_status()
-            resp_data = response.json()
+            resp_data = await asyncio.to_thread(_call_nlp, payload)
             queries = resp_data["queries"]
             original_lang = resp_data.get("detected_lang", "en")
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"NLP Service Failed: {e}")
 
-    # Search Bing
     final_market = _get_market_code(data.market) or _get_market_code(original_lang)
-    all_dated_results = []
+    return queries, final_market, search_depth, warning_message
+
+@app.post("/search/incremental", response_model=IncrementalResponse)
+async def search_incremental(data: IncrementalInput):
+    """
+    Re-runs previously generated search terms and returns only the results that
+    are new since the watermark, without going through the NLP service again.
+    """
+    scraper = ml_models["scraper"]
+    market = _get_market_code(data.market)
+    queries = [query.model_dump() for query in data.queries]
+    known_urls = list(data.watermark.known_urls)
 
     for query in queries:
-        term = query.get("search_term")
-        entities = query.get("entities", [])
-        
-        results_with_dates, websites_without_dates = await asyncio.to_thread(
-            scraper.search_bing,
-            term,
-            entities=entities,
-            num_results=data.search_depth,
-            num_undated_target=data.search_depth,
-            market=final_market
+        news_results, website_results = await asyncio.to_thread(
+            scraper.search_bing_incremental,
+            query["search_term"],
+            known_urls,
+            newest_date=data.watermark.newest_date,
+            market=market,
+            entities=query["entities"],
+            max_pages=data.max_pages
         )
+        query["news_results"] = news_results
+        query["website_results"] = website_results
+        # Later queries should not report what an earlier one already found
+        known_urls.extend(r.url for r in news_results + website_results if r.url)
 
-        query["news_results"] = results_with_dates
-        query["website_results"] = websites_without_dates
-        all_dated_results.extend(results_with_dates)
+    clusters = await asyncio.to_thread(ml_models["dedup"].dedupe_queries, queries)
+    new_results = sum(len(q["news_results"]) + len(q["website_results"]) for q in queries)
+    dates = [r.date for q in queries for r in q["news_results"]]
+    if data.watermark.newest_date is not None:
+        dates.append(data.watermark.newest_date)
 
-    oldest = await asyncio.to_thread(scraper.get_oldest_result, all_dated_results)
-    return {"warning": warning_message, "result": queries, "oldest_result": oldest}
+    body = dumps({
+        "result": queries,
+        "clusters": clusters,
+        "new_results": new_results,
+        "watermark": {"newest_date": max(dates, default=None), "known_urls": list(dict.fromkeys(known_urls))},
+    })
+    return Response(content=body, media_type="application/json")
+
+# --- Jobs ---
+# Submitting returns immediately, results are polled or streamed per query as they complete
+@app.post("/jobs/link")
+async def submit_link_job(data: Input):
+    return await _submit_job("link", data)
+
+@app.post("/jobs/text")
+async def submit_text_job(data: Input):
+    return await _submit_job("text", data)
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job["cancel_requested"] = jobs.is_cancelled(job_id)
+    return job
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str):
+    """
+    Newline delimited JSON: one "query" event per completed query, then a
+    final event named after the job's end status with the full job.
+    """
+    if await asyncio.to_thread(jobs.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        sent = 0
+        while True:
+            job = await asyncio.to_thread(jobs.get, job_id)
+            if job is None:
+                return
+            partial = job.pop("partial_results")
+            for index in range(sent, len(partial)):
+                yield dumps({"event": "query", "index": index, "query": partial[index]}) + b"\n"
+            sent = len(partial)
+            if job["status"] in FINISHED_STATUSES:
+                yield dumps({"event": job["status"], "job": job}) + b"\n"
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/jobs/{job_id}/cancel")
+@app.post("/cancel/{job_id}")
+async def cancel_job(job_id: str):
+    job = await asyncio.to_thread(jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] in FINISHED_STATUSES:
+        return job
+
+    await asyncio.to_thread(jobs.cancel, job_id)
+    # The NLP step runs in another service, stop it there too
+    await asyncio.to_thread(_cancel_nlp, job_id)
+    return await asyncio.to_thread(jobs.get, job_id)
+
+async def _submit_job(kind: str, data: Input) -> Dict[str, Any]:
+    try:
+        job = await asyncio.to_thread(jobs.create, kind, data.model_dump(), data.job_id)
+    except JobExists:
+        raise HTTPException(status_code=409, detail=f"Job {data.job_id} is already running")
+    task = asyncio.create_task(_run_job(job["id"], kind, data))
+    task.add_done_callback(lambda t: _on_job_done(job["id"], t))
+    jobs.attach(job["id"], task)
+    return {"job_id": job["id"], "status": job["status"]}
+
+def _on_job_done(job_id: str, task: asyncio.Task):
+    # A task cancelled before its first step never runs _run_job, record the cancel here
+    if task.cancelled():
+        asyncio.ensure_future(asyncio.to_thread(jobs.update, job_id, status="cancelled"))
+
+async def _run_job(job_id: str, kind: str, data: Input):
+    # Job records live in SQLite, every read and write goes through a thread
+    update = lambda **fields: asyncio.to_thread(jobs.update, job_id, **fields)
+    should_stop = lambda: jobs.is_cancelled(job_id)
+
+    try:
+        prepare = _prepare_link if kind == "link" else _prepare_text
+        await update(status="running", stage="nlp")
+        queries, market, search_depth, warning = await prepare(data, request_id=job_id)
+        if await asyncio.to_thread(should_stop):
+            raise asyncio.CancelledError()
+
+        await update(stage="search", warning=warning, total_queries=len(queries))
+        oldest, clusters = await _search_queries(
+            ml_models["scraper"],
+            queries,
+            search_depth,
+            market,
+            on_query_done=lambda query: jobs.add_partial_result(job_id, query),
+            should_stop=should_stop
+        )
+        if await asyncio.to_thread(should_stop):
+            raise asyncio.CancelledError()
+
+        await update(status="done", stage=None, result=queries, oldest_result=oldest, clusters=clusters)
+    except asyncio.CancelledError:
+        await update(status="cancelled")
+    except Exception as e:
+        # A cancel handled by another worker only reaches this one as a failed NLP call (409)
+        if await asyncio.to_thread(should_stop) or (isinstance(e, HTTPException) and e.status_code == 409):
+            await update(status="cancelled")
+        elif isinstance(e, HTTPException):
+            await update(status="failed", error=e.detail, error_status=e.status_code)
+        else:
+            print(f"Job {job_id} failed: {e}")
+            await update(status="failed", error=str(e))
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Each worker is a separate process with its own scraper, caches are shared through SHARED_STORE_PATH
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=int(os.getenv("WEB_CONCURRENCY", "1")))
\ No newline at end of file
@@ -1 +1,8 @@
-from .web_search import WebScraping
\ No newline at end of file
+from .web_search import WebScraping
+from .singleflight import SingleFlight, CallCancelled
+from .dedup import ResultDeduplicator
+from .relevance import RelevanceScorer
+from .language import detect_language, detect_languages
+from .store import SharedStore
+from .jobs import SearchJobs, JobExists, FINISHED_STATUSES
+from .results import SearchResult, dumps, loads
@@ -0,0 +1,192 @@
+import re
+import zlib
+import random
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from .results import SearchResult
+
+# Only keys known to be click or campaign tracking, generic names like ref or src often select content
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "twclid", "igshid",
+    "mc_cid", "mc_eid", "ocid", "cmpid", "smid", "ref_src", "_ga", "_gl",
+}
+DEFAULT_PORTS = {80, 443}
+MOBILE_HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+AMP_CACHE_SUFFIX = ".cdn.ampproject.org"
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+class ResultDeduplicator:
+    """
+    Deduplicates search results across all queries of a request.
+
+    Results are grouped when their canonical URLs match, or when their
+    title + snippet shingles are near-duplicates according to MinHash/LSH
+    (syndicated copies of the same story under different URLs).
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.5, shingle_size: int = 3, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    @staticmethod
+    def canonicalize_url(url: Optional[str]) -> str:
+        """
+        Strips tracking parameters, AMP and mobile variants so that the same
+        page reached through different links compares equal.
+        """
+        if not url:
+            return ""
+        parts = urlsplit(url.strip())
+        host = (parts.hostname or "").lower()
+        path = parts.path
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+
+        # Google AMP cache: https://host-com.cdn.ampproject.org/c/s/host.com/path
+        if host.endswith(AMP_CACHE_SUFFIX):
+            segments = path.split("/")
+            if len(segments) > 3 and segments[1] == "c":
+                rest = segments[3:] if segments[2] == "s" else segments[2:]
+                host, path, port = rest[0].lower(), "/" + "/".join(rest[1:]), None
+
+        for prefix in MOBILE_HOST_PREFIXES:
+            if host.startswith(prefix):
+                host = host[len(prefix):]
+                break
+        # The scheme is normalized below, so only non-default ports tell pages apart
+        netloc = f"[{host}]" if ":" in host else host
+        if port and port not in DEFAULT_PORTS:
+            netloc = f"{netloc}:{port}"
+
+        segments = [s for s in path.split("/") if s and s.lower() != "amp"]
+        if segments and segments[-1].lower().endswith(".amp"):
+            segments[-1] = segments[-1][:-4]
+        path = "/" + "/".join(segments)
+
+        query = sorted(
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+        )
+        return urlunsplit(("https", netloc, path, urlencode(query), ""))
+
+    def _shingles(self, text: str) -> set:
+        tokens = _TOKEN_RE.findall(text.lower())
+        if len(tokens) < self.shingle_size:
+            return {" ".join(tokens)} if tokens else set()
+        return {" ".join(tokens[i:i + self.shingle_size]) for i in range(len(tokens) - self.shingle_size + 1)}
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        shingles = self._shingles(text)
+        if not shingles:
+            return None
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms)
+
+    def _similarity(self, sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / self.num_perm
+
+    def cluster(self, items: List[SearchResult]) -> List[List[int]]:
+        """
+        Groups item indices into clusters of duplicates, in first-seen order.
+        """
+        parent = list(range(len(items)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i: int, j: int):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+
+        by_url: Dict[str, int] = {}
+        buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+        signatures: List[Optional[Tuple[int, ...]]] = []
+
+        for i, item in enumerate(items):
+            canonical = self.canonicalize_url(item.url)
+            if canonical:
+                if canonical in by_url:
+                    union(by_url[canonical], i)
+                else:
+                    by_url[canonical] = i
+
+            # Use the untranslated text when present, syndicated copies share the source wording
+            title = item.original_title or item.title or ""
+            snippet = item.original_snippet or item.snippet or ""
+            sig = self.signature(f"{title} {snippet}")
+            signatures.append(sig)
+            if sig is None:
+                continue
+            for band in range(self.bands):
+                band_key = (band, sig[band * self.rows:(band + 1) * self.rows])
+                for j in buckets[band_key]:
+                    if find(i) != find(j) and self._similarity(sig, signatures[j]) >= self.threshold:
+                        union(i, j)
+                buckets[band_key].append(i)
+
+        groups: Dict[int, List[int]] = defaultdict(list)
+        for i in range(len(items)):
+            groups[find(i)].append(i)
+        return list(groups.values())
+
+    @staticmethod
+    def _pick_representative(items: List[SearchResult], members: List[int]) -> int:
+        # Prefer the oldest dated result, the service is about finding the original source
+        dated = [i for i in members if items[i].date is not None]
+        if dated:
+            return min(dated, key=lambda i: (items[i].date, i))
+        return members[0]
+
+    def dedupe_queries(self, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Removes duplicates across the news_results/website_results of all
+        queries in place, keeping one representative per cluster where it was
+        found. Returns the clusters that had more than one member.
+        """
+        entries: List[Tuple[int, str, SearchResult]] = []
+        for q_idx, query in enumerate(queries):
+            for field in ("news_results", "website_results"):
+                for item in query.get(field) or []:
+                    entries.append((q_idx, field, item))
+
+        items = [item for _, _, item in entries]
+        keep = set()
+        clusters = []
+        for members in self.cluster(items):
+            rep = self._pick_representative(items, members)
+            keep.add(rep)
+            if len(members) == 1:
+                continue
+            clusters.append({
+                "representative": items[rep],
+                "size": len(members),
+                "urls": list(dict.fromkeys(items[i].url for i in members if items[i].url)),
+                "search_terms": list(dict.fromkeys(queries[entries[i][0]].get("search_term") for i in members)),
+            })
+
+        kept: Dict[Tuple[int, str], List[SearchResult]] = defaultdict(list)
+        for i in sorted(keep):
+            q_idx, field, item = entries[i]
+            kept[(q_idx, field)].append(item)
+        for q_idx, query in enumerate(queries):
+            for field in ("news_results", "website_results"):
+                if field in query:
+                    query[field] = kept.get((q_idx, field), [])
+
+        return clusters
@@ -0,0 +1,102 @@
+import time
+import uuid
+import asyncio
+from typing import Any, Dict, Optional
+from .store import SharedStore
+
+FINISHED_STATUSES = {"done", "failed", "cancelled"}
+
+class JobExists(Exception):
+    """Raised when a caller-supplied job id belongs to a job that is still running."""
+
+class SearchJobs:
+    """
+    Keeps track of background search jobs.
+
+    Job records and cancel flags live in the SharedStore, so any worker can
+    report on or cancel a job. The asyncio task running a job only exists in
+    the worker that accepted it; other workers cancel it through the flag,
+    which the running job polls between queries and Bing pages.
+
+    Every method except attach does blocking SQLite I/O, async code calls
+    them through asyncio.to_thread.
+    """
+
+    def __init__(self, store: SharedStore, ttl: float = 3600):
+        self.store = store
+        self.ttl = ttl
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    @staticmethod
+    def _cancel_key(job_id: str) -> str:
+        return f"job:{job_id}:cancel"
+
+    def _save(self, job: Dict[str, Any]):
+        job["updated_at"] = time.time()
+        self.store.set(self._key(job["id"]), job, ttl=self.ttl)
+
+    def create(self, kind: str, params: Dict[str, Any], job_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Creates a queued job, under job_id when the caller supplies its own id.
+        A caller id can only be reused once its previous job has finished.
+        """
+        if job_id is not None:
+            existing = self.get(job_id)
+            if existing is not None and existing["status"] not in FINISHED_STATUSES:
+                raise JobExists(job_id)
+        job = {
+            "id": job_id or uuid.uuid4().hex,
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "stage": None,
+            "warning": None,
+            "total_queries": None,
+            "partial_results": [],
+            "result": None,
+            "oldest_result": None,
+            "clusters": [],
+            "error": None,
+            "error_status": None,
+            "created_at": time.time(),
+        }
+        # A reused caller id must not inherit an earlier cancel
+        self.store.delete(self._cancel_key(job["id"]))
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(self._key(job_id))
+
+    def update(self, job_id: str, **fields) -> Optional[Dict[str, Any]]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        self._save(job)
+        return job
+
+    def add_partial_result(self, job_id: str, query: Dict[str, Any]):
+        job = self.get(job_id)
+        if job is None:
+            return
+        job["partial_results"].append(query)
+        self._save(job)
+
+    def attach(self, job_id: str, task: asyncio.Task):
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def cancel(self, job_id: str):
+        self.store.set(self._cancel_key(job_id), True, ttl=self.ttl)
+        task = self._tasks.get(job_id)
+        if task is not None:
+            # Called from a worker thread so the store write stays off the event loop
+            task.get_loop().call_soon_threadsafe(task.cancel)
+
+    def is_cancelled(self, job_id: str) -> bool:
+        return self.store.get(self._cancel_key(job_id)) is not None
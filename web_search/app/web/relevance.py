@@ -0,0 +1,50 @@
+import re
+from typing import Dict, FrozenSet, List, Optional
+from .results import SearchResult
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in",
+    "is", "it", "its", "new", "of", "on", "or", "that", "the", "this", "to", "was", "were",
+    "will", "with",
+})
+
+def tokenize(text: Optional[str]) -> FrozenSet[str]:
+    if not text:
+        return frozenset()
+    return frozenset(t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS)
+
+class RelevanceScorer:
+    """
+    Scores search results against a query and its named entities.
+
+    The query and entity tokens are weighted once up front (entity tokens
+    count entity_weight times as much as plain query terms), so scoring a
+    result is a set intersection over its title and snippet tokens.
+    Scores are in [0, 1].
+    """
+
+    def __init__(self, query: str, entities: Optional[List[Dict[str, str]]] = None, entity_weight: float = 2.0, title_weight: float = 0.6):
+        self.title_weight = title_weight
+        self.weights: Dict[str, float] = {t: 1.0 for t in tokenize(query)}
+        for entity in entities or []:
+            for token in tokenize(entity.get("name")):
+                self.weights[token] = max(self.weights.get(token, 0.0), entity_weight)
+        self.vocabulary = frozenset(self.weights)
+        self.total = sum(self.weights.values())
+
+    @property
+    def active(self) -> bool:
+        return self.total > 0
+
+    def _overlap(self, tokens: FrozenSet[str]) -> float:
+        return sum(self.weights[t] for t in tokens & self.vocabulary) / self.total
+
+    def score(self, result: SearchResult) -> float:
+        if not self.active:
+            return 1.0
+        # Match the untranslated text too, the query may be in the source language
+        title_tokens = tokenize(result.title) | tokenize(result.original_title)
+        snippet_tokens = tokenize(result.snippet) | tokenize(result.original_snippet)
+        return self.title_weight * self._overlap(title_tokens) + (1 - self.title_weight) * self._overlap(snippet_tokens)
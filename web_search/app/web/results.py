@@ -0,0 +1,45 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Optional
+import orjson
+
+@dataclass(slots=True)
+class SearchResult:
+    """
+    One Bing result. The publication date is kept parsed, it is only turned
+    into a string when the response is serialized.
+    """
+    title: Optional[str]
+    url: Optional[str]
+    snippet: str
+    date: Optional[date] = None
+    original_title: Optional[str] = None
+    original_snippet: Optional[str] = None
+    original_language: Optional[str] = None
+    relevance: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"title": self.title, "url": self.url, "snippet": self.snippet}
+        if self.date is not None:
+            data["date"] = self.date
+        if self.original_language:
+            data["title"] = f"{self.title} (original language source: {self.original_language})"
+            data["original_title"] = self.original_title
+            data["original_snippet"] = self.original_snippet
+            data["original_language"] = self.original_language
+        data["relevance"] = self.relevance
+        return data
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, SearchResult):
+        return obj.to_dict()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(obj: Any) -> bytes:
+    """
+    Serializes responses containing SearchResult records with orjson.
+    Dates are written as YYYY-MM-DD.
+    """
+    return orjson.dumps(obj, default=_default, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+
+loads = orjson.loads
@@ -0,0 +1,132 @@
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from .store import SharedStore
+
+_MISSING = object()
+
+class CallCancelled(Exception):
+    """Raised to a caller whose cancel event fired before the result was ready."""
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls onto one running computation.
+
+    Callers that arrive while a computation for the same key is running await
+    that computation instead of starting their own. Successful results are kept
+    in a small TTL cache so requests arriving right after completion are served
+    without recomputing. Failures are never cached.
+
+    With a SharedStore, results are also published to the other worker
+    processes, so keys must be JSON serializable and results JSON compatible.
+    Store reads and writes run in the default executor, never on the event loop.
+
+    With cancel_abandoned, the computation is cancelled once every caller
+    waiting on it has been cancelled.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 256, store: Optional[SharedStore] = None, cancel_abandoned: bool = False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store = store
+        self.cancel_abandoned = cancel_abandoned
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+        self._cache: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._cache.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._cache[key]
+            return _MISSING
+        self._cache.move_to_end(key)
+        return value
+
+    @staticmethod
+    def _shared_key(key: Hashable) -> str:
+        return "singleflight:" + json.dumps(key)
+
+    def _store(self, key: Hashable, value: Any, publish: bool = True):
+        if self.ttl <= 0:
+            return
+        self._cache[key] = (time.monotonic() + self.ttl, value)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        if publish and self.store is not None:
+            asyncio.get_running_loop().run_in_executor(None, self._publish, key, value)
+
+    def _publish(self, key: Hashable, value: Any):
+        try:
+            self.store.set(self._shared_key(key), value, ttl=self.ttl)
+        except Exception as e:
+            # The other workers recompute instead, not worth failing the request
+            print(f"Warning: Could not publish result to the shared store: {e}")
+
+    def _on_done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Reading the exception also marks it as retrieved when nobody is waiting
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._store(key, task.result())
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], cancel: Optional[asyncio.Event] = None) -> Any:
+        """
+        Returns the result of fn() for the given key, sharing a cached or
+        in-flight computation when one exists.
+        Setting cancel makes this caller stop waiting with CallCancelled.
+        """
+        cached = self._lookup(key)
+        if cached is not _MISSING:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None and self.store is not None:
+            shared = await asyncio.to_thread(self.store.get, self._shared_key(key))
+            if shared is not None:
+                self._store(key, shared, publish=False)
+                return shared
+            # Another caller may have started or finished the computation during the read
+            cached = self._lookup(key)
+            if cached is not _MISSING:
+                return cached
+            task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            if cancel is None:
+                # A caller going away must not cancel the work other callers are waiting on
+                return await asyncio.shield(task)
+            cancelled = asyncio.ensure_future(cancel.wait())
+            try:
+                await asyncio.wait({task, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                cancelled.cancel()
+            if not task.done():
+                raise CallCancelled()
+            return task.result()
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                if self.cancel_abandoned and not task.done():
+                    task.cancel()
+
+    def forget(self, key: Hashable):
+        self._cache.pop(key, None)
+        if self.store is not None:
+            self.store.delete(self._shared_key(key))
+
+    @property
+    def inflight(self) -> int:
+        return len(self._inflight)
@@ -0,0 +1,65 @@
+import time
+import sqlite3
+import threading
+from typing import Any, Optional
+from .results import dumps, loads
+
+class SharedStore:
+    """
+    Small key-value store with TTLs, backed by a local SQLite file.
+
+    Every uvicorn worker process opens the same file, so results and caches
+    written by one worker are visible to the others. Values are stored as JSON,
+    SearchResult records are stored as their response dicts.
+    """
+
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS store ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM store WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO store (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, dumps(value).decode(), expires_at),
+            )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def delete(self, key: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM store WHERE key = ?", (key,))
+
+    def purge(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM store WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
@@ -1,45 +1,68 @@
 import time
 import logging
+from operator import attrgetter
 import dateparser
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from datetime import date, datetime
+from concurrent.futures import Executor
+from typing import Callable, Iterable, List, Dict, Optional, Tuple
 from urllib.parse import parse_qs, quote_plus, unquote, urlparse
 from bs4 import BeautifulSoup
 from stealth_requests import StealthSession
 from deep_translator import GoogleTranslator
-from langdetect import detect, LangDetectException
+from .relevance import RelevanceScorer
+from .language import detect_languages
+from .store import SharedStore
+from .results import SearchResult
+from .dedup import ResultDeduplicator
 
 class WebScraping:
     DEFAULT_NUM_RESULTS = 100
     DEFAULT_UNDATED_NUM_RESULTS = 15
-
-    def __init__(self):
+    # Stop paging once this many pages in a row average below the relevance threshold
+    DEFAULT_MIN_PAGE_RELEVANCE = 0.15
+    DEFAULT_RELEVANCE_PATIENCE = 2
+    TRANSLATION_CACHE_TTL = 7 * 24 * 3600
+    RESULTS_PER_PAGE = 10
+    # Hard limits per query, whatever the caller asks for
+    MAX_PAGES = 50
+    MAX_DURATION_SEC = 90
+    DEFAULT_INCREMENTAL_PAGES = 3
+    MAX_INCREMENTAL_PAGES = 10
+
+    def __init__(self, parse_pool: Optional[Executor] = None, store: Optional[SharedStore] = None):
+        """
+        - parse_pool: optional process pool that runs the CPU-bound SERP parsing.
+        - store: optional store shared with the other workers, used to cache translations.
+        """
         self.log = logging.getLogger("WebScraping Class")
         logging.basicConfig(level=logging.DEBUG)
         self.interrupt = False
+        self.parse_pool = parse_pool
+        self.store = store
         
     def interrupt_search(self):
         self.interrupt = True
 
-    def _translate_result(self, title: str, snippet: str) -> Tuple[str, str, Optional[str]]:
-        if not title:
+    def _translate_result(self, title: str, snippet: str, lang: Optional[str]) -> Tuple[str, str, Optional[str]]:
+        if not title or not lang or lang == 'en':
             return title, snippet, None
 
-        try:
-            lang = detect(title)
-            
-            if lang == 'en':
-                return title, snippet, None
+        cache_key = f"translation:{lang}:{title}\x1f{snippet}"
+        if self.store is not None:
+            cached = self.store.get(cache_key)
+            if cached:
+                return cached[0], cached[1], lang
 
+        try:
             translator = GoogleTranslator(source='auto', target='en')
             to_translate = [title or "", snippet or ""]
             translations = translator.translate_batch(to_translate)
             translated_title, translated_snippet = translations[0], translations[1]
             if not translated_title:
                 return title, snippet, None
+            if self.store is not None:
+                self.store.set(cache_key, [translated_title, translated_snippet], ttl=self.TRANSLATION_CACHE_TTL)
             return translated_title, translated_snippet, lang
-        except LangDetectException:
-            return title, snippet, None
         except Exception as e:
             self.log.warning(f"Translation failed for '{title}': {e}")
             return title, snippet, None
@@ -95,13 +118,16 @@ class WebScraping:
             return None
     '''
 
-    def parse_bing_results(self, html: str, search_type: str) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    @staticmethod
+    def extract_serp_items(html: str, search_type: str) -> List[Tuple[Optional[str], Optional[str], str, Optional[datetime]]]:
         """
-        Parses Bing SERP Elements to retrieve title, url, snippet and date
+        Parses Bing SERP Elements to retrieve title, url, snippet and date.
+        This is the CPU-heavy part of handling a page (BeautifulSoup and dateparser) and only
+        takes and returns picklable values, so it can run in a process pool.
         """
+        log = logging.getLogger("WebScraping Class")
         soup = BeautifulSoup(html, "lxml")
-        results_with_date = []
-        websites = []
+        parsed_items = []
 
         container_selectors = ".news-card, li.b_algo"
         if search_type == 'web':
@@ -152,59 +178,78 @@ class WebScraping:
                 # Parsing title, url, snippet
                 if a_tag:
                     title = a_tag.get_text(strip=True)
-                    url = self.clean_bing_url(a_tag.get("href", ""))
+                    url = WebScraping.clean_bing_url(a_tag.get("href", ""))
                 if snippet_tag:
                     snippet = snippet_tag.get_text(strip=True)
 
             except Exception as e:
-                self.log.warning(f"Error parsing item structure: {e} - HTML: {item.prettify()[:200]}")
+                log.warning(f"Error parsing item structure: {e} - HTML: {item.prettify()[:200]}")
                 continue
 
-            original_title = title
-            original_snippet = snippet
-            translated_title, translated_snippet, original_lang = self._translate_result(title, snippet)
-            title = translated_title
-            snippet = translated_snippet
-
             if date_text:
-                date = self.parse_bing_date(date_text)
-            
-            if title and url and date:
-                result_data = {
-                    "title": title,
-                    "url": url,
-                    "snippet": snippet,
-                    "date": date.strftime("%Y-%m-%d")
-                }
-                
-                if original_lang:
-                    result_data["title"] = f"{title} (original language source: {original_lang})"
-                    result_data["original_title"] = original_title
-                    result_data["original_snippet"] = original_snippet
-                    result_data["original_language"] = original_lang
-                
-                results_with_date.append(result_data)
-                
-            elif title or url:
+                date = WebScraping.parse_bing_date(date_text)
+            parsed_items.append((title, url, snippet, date))
+
+        return parsed_items
+
+    def parse_bing_results(self, html: str, search_type: str) -> Tuple[List[SearchResult], List[SearchResult]]:
+        """
+        Parses Bing SERP Elements and translates non-English results
+        """
+        results_with_date = []
+        websites = []
+
+        if self.parse_pool is not None:
+            parsed_items = self.parse_pool.submit(self.extract_serp_items, html, search_type).result()
+        else:
+            parsed_items = self.extract_serp_items(html, search_type)
+
+        # Identify the language of every title on the page in one batch
+        title_langs = detect_languages([title for title, _, _, _ in parsed_items])
+
+        for (title, url, snippet, date), title_lang in zip(parsed_items, title_langs):
+            translated_title, translated_snippet, original_lang = self._translate_result(title, snippet, title_lang)
+            result = SearchResult(title=translated_title, url=url, snippet=translated_snippet)
+
+            # Untranslated text is only kept when it differs from the translation
+            if original_lang:
+                result.original_title = title
+                result.original_snippet = snippet
+                result.original_language = original_lang
+
+            if translated_title and url and date:
+                result.date = date.date()
+                results_with_date.append(result)
+            elif translated_title or url:
                 # Website dates
-                web_data = {
-                    "title": title,
-                    "url": url,
-                    "snippet": snippet,
-                }
-                if original_lang:
-                    web_data["title"] = f"{title} (original language source: {original_lang})"
-                    web_data["original_title"] = original_title
-                    web_data["original_snippet"] = original_snippet
-                    web_data["original_language"] = original_lang
-                    
-                websites.append(web_data)
+                websites.append(result)
 
         if not results_with_date and not websites and html: 
             self.log.warning(f"No results parsed from page.")
 
         return results_with_date, websites
 
+    def _fetch_page(self, session: StealthSession, query: str, page: int, market: str, search_type: str) -> Optional[Tuple[List[SearchResult], List[SearchResult]]]:
+        """
+        Fetches and parses one SERP page, None when the request failed.
+        """
+        first = page * self.RESULTS_PER_PAGE + 1
+        url = self.build_bing_search_url(query, first, market=market)
+        self.log.info(f"Fetching {url} ...")
+
+        try:
+            resp = session.get(url, timeout=15)
+        except Exception as e:
+            self.log.warning(f"Request failed: {e}")
+            return None
+
+        if resp.status_code != 200:
+            self.log.warning(f"Error: {resp.status_code}")
+            return None
+
+        html = getattr(resp, "text", "")
+        return self.parse_bing_results(html, search_type=search_type)
+
     def search_bing(
         self,
         query: str,
@@ -212,23 +257,30 @@ class WebScraping:
         num_undated_target: int = DEFAULT_UNDATED_NUM_RESULTS,
         search_type: str = 'news',
         market: Optional[str] = None,
-        entities: Optional[List[Dict[str, str]]] = None
-    ) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+        entities: Optional[List[Dict[str, str]]] = None,
+        min_page_relevance: float = DEFAULT_MIN_PAGE_RELEVANCE,
+        relevance_patience: int = DEFAULT_RELEVANCE_PATIENCE,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> Tuple[List[SearchResult], List[SearchResult]]:
         """
         - Detects language and sets region.
         - User can override market.
         - If detection fails, fallback to english (standard).
+        - Scores results against the query and entities, returns them ranked by relevance
+          and stops paging early when consecutive pages are mostly irrelevant.
+        - should_stop is polled before every page, so a single search can be cancelled
+          without interrupting the others running on this instance.
         """
-        results_with_dates: List[Dict[str, str]] = []
-        websites_without_dates: List[Dict[str, str]] = []
+        results_with_dates: List[SearchResult] = []
+        websites_without_dates: List[SearchResult] = []
 
         seen_urls = set()
-        per_page = 10
         page = 0
+        scorer = RelevanceScorer(query, entities)
+        low_relevance_pages = 0
 
-        # --- Updated Configuration ---
-        MAX_PAGES = 50
-        MAX_DURATION_SEC = 90
+        MAX_PAGES = self.MAX_PAGES
+        MAX_DURATION_SEC = self.MAX_DURATION_SEC
         start_time = time.time()
         
         # Reset the interrupt
@@ -251,53 +303,115 @@ class WebScraping:
                     break
                 
                 # User interrupts search
-                if self.interrupt: 
+                if self.interrupt or (should_stop is not None and should_stop()): 
                     self.log.info('Search interrupted by user')
                     break
 
-                first = page * per_page + 1
-                url = self.build_bing_search_url(query, first, market=final_market)
-                self.log.info(f"Fetching {url} ...")
-
-                try:
-                    resp = session.get(url, timeout=15)
-                except Exception as e:
-                    self.log.warning(f"Request failed: {e}")
+                parsed_page = self._fetch_page(session, query, page, final_market, search_type)
+                if parsed_page is None:
                     break
-
-                if resp.status_code != 200:
-                    self.log.warning(f"Error: {resp.status_code}")
-                    break
-
-                html = getattr(resp, "text", "")
-                page_dated_results, page_undated_websites = self.parse_bing_results(
-                    html, search_type=search_type 
-                ) 
+                page_dated_results, page_undated_websites = parsed_page
 
                 if not page_dated_results and not page_undated_websites:
                     self.log.warning("No results found on this page. Stopping search.")
                     break
 
                 # Add to the list only different urls, prevents duplication
+                page_scores = []
                 for result in page_dated_results:
-                    if result['url'] not in seen_urls and len(results_with_dates) < num_results:
+                    if result.url not in seen_urls:
+                        result.relevance = round(scorer.score(result), 3)
+                        page_scores.append(result.relevance)
                         results_with_dates.append(result)
-                        seen_urls.add(result['url'])
+                        seen_urls.add(result.url)
 
                 for result in page_undated_websites:
-                    if result['url'] not in seen_urls and len(websites_without_dates) < num_undated_target:
+                    if result.url not in seen_urls:
+                        result.relevance = round(scorer.score(result), 3)
+                        page_scores.append(result.relevance)
                         websites_without_dates.append(result)
-                        seen_urls.add(result['url'])
+                        seen_urls.add(result.url)
 
                 if len(results_with_dates) >= num_results and len(websites_without_dates) >= num_undated_target:
                     self.log.info("Both dated and undated result targets met. Stopping search.")
                     break
+
+                # Later pages drift off-topic, stop paying for them once they stop adding relevant results
+                if scorer.active:
+                    page_relevance = sum(page_scores) / len(page_scores) if page_scores else 0.0
+                    low_relevance_pages = low_relevance_pages + 1 if page_relevance < min_page_relevance else 0
+                    if low_relevance_pages >= relevance_patience:
+                        self.log.info(f"Page relevance {page_relevance:.2f} below {min_page_relevance} for {low_relevance_pages} pages. Stopping search.")
+                        break
                 page += 1
 
+        # Stable sort keeps Bing's order among equally relevant results
+        results_with_dates.sort(key=attrgetter("relevance"), reverse=True)
+        websites_without_dates.sort(key=attrgetter("relevance"), reverse=True)
         return results_with_dates[:num_results], websites_without_dates[:num_undated_target]
 
+    def search_bing_incremental(
+        self,
+        query: str,
+        known_urls: Iterable[str],
+        newest_date: Optional[date] = None,
+        market: Optional[str] = None,
+        entities: Optional[List[Dict[str, str]]] = None,
+        max_pages: int = DEFAULT_INCREMENTAL_PAGES,
+        search_type: str = 'news',
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> Tuple[List[SearchResult], List[SearchResult]]:
+        """
+        Re-runs a query that was searched before and returns only what is new since then.
+        - known_urls: URLs already returned for it, compared in canonical form.
+        - newest_date: newest result date already seen, dated results older than it are not new.
+        - Only the first max_pages pages (at most MAX_INCREMENTAL_PAGES) are fetched, and
+          paging stops at the first page without any new result since the rest has been seen already.
+        """
+        new_dated: List[SearchResult] = []
+        new_undated: List[SearchResult] = []
+        seen = {ResultDeduplicator.canonicalize_url(url) for url in known_urls}
+        scorer = RelevanceScorer(query, entities)
+        final_market = market or "en-US"
+        max_pages = max(1, min(max_pages, self.MAX_INCREMENTAL_PAGES))
+        start_time = time.time()
+
+        with StealthSession() as session:
+            for page in range(max_pages):
+                if time.time() - start_time > self.MAX_DURATION_SEC:
+                    self.log.warning(f"Search timed out after {self.MAX_DURATION_SEC} seconds.")
+                    break
+
+                if self.interrupt or (should_stop is not None and should_stop()):
+                    self.log.info('Search interrupted by user')
+                    break
+
+                parsed_page = self._fetch_page(session, query, page, final_market, search_type)
+                if parsed_page is None:
+                    break
+                page_dated_results, page_undated_websites = parsed_page
+
+                found = 0
+                for result in page_dated_results + page_undated_websites:
+                    canonical = ResultDeduplicator.canonicalize_url(result.url)
+                    if not canonical or canonical in seen:
+                        continue
+                    seen.add(canonical)
+                    if result.date is not None and newest_date is not None and result.date < newest_date:
+                        continue
+                    result.relevance = round(scorer.score(result), 3)
+                    (new_dated if result.date is not None else new_undated).append(result)
+                    found += 1
+
+                if not found:
+                    self.log.info("No new results on this page. Stopping search.")
+                    break
+
+        new_dated.sort(key=attrgetter("relevance"), reverse=True)
+        new_undated.sort(key=attrgetter("relevance"), reverse=True)
+        return new_dated, new_undated
+
     @staticmethod
-    def get_oldest_result(dated_results: List[Dict[str, str]]) -> Optional[Dict[str, str]]:
-        if not dated_results:
-            return None
-        return min(dated_results, key=lambda x: datetime.strptime(x["date"], "%Y-%m-%d"))
\ No newline at end of file
+    def get_oldest_result(dated_results: List[SearchResult]) -> Optional[SearchResult]:
+        # Dates are kept parsed, so this is a single pass without re-parsing
+        return min(dated_results, key=attrgetter("date"), default=None)
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Compares the shared language identifier against langdetect.
+
+Reports per-call latency for SERP-title sized and article sized inputs, how
+often both libraries agree, and how many short English titles each of them
+labels as another language (ours may return None, callers treat it as
+English). Needs langdetect installed next to the
+service requirements:
+
+    pip install langdetect
+    PYTHONPATH=app python benchmarks/bench_language.py
+"""
+import time
+import statistics
+from langdetect import DetectorFactory, detect
+from web.language import _detect_short, detect_language, detect_languages
+
+DetectorFactory.seed = 0
+
+TITLES = [
+    "Nvidia to invest $5 billion in Intel as the chipmakers team up",
+    "US Space Command headquarters to move to Alabama, Trump says",
+    "Trump says Ukraine has expressed no gratitude for US efforts",
+    "Bundesregierung beschließt neues Klimaschutzpaket",
+    "Die Inflation in Deutschland ist im Oktober leicht gesunken",
+    "Le gouvernement français annonce une réforme des retraites",
+    "Incendie à Marseille : des centaines d'habitants évacués",
+    "Il governo italiano approva la legge di bilancio",
+    "Maltempo in Emilia-Romagna, scuole chiuse domani",
+    "El Gobierno de España aprueba la subida del salario mínimo",
+    "La selección argentina gana la final en el último minuto",
+    "Regering presenteert nieuwe plannen voor woningbouw",
+    "Governo brasileiro anuncia novo programa de habitação",
+    "Regeringen föreslår sänkt skatt för pensionärer",
+    "Правительство России объявило о новых мерах поддержки",
+    "日本政府は新しい経済対策を発表した",
+    "Hükümet yeni ekonomik paketi açıkladı",
+    "Rząd przyjął projekt budżetu na przyszły rok",
+    "Danmark indfører nye regler for elbiler",
+    "Η κυβέρνηση ανακοίνωσε νέα μέτρα για την ακρίβεια",
+]
+
+# Short English headlines are the hard case: a few words often score higher for another language
+SHORT_EN_TITLES = [
+    "Apple unveils new iPhone", "Tesla stock soars", "Fed raises rates", "Ukraine war latest",
+    "Taylor Swift tour dates", "Messi scores twice", "COVID-19 cases rise", "Oil prices fall",
+    "Biden signs climate bill", "Stocks rally on jobs report", "NASA launches Artemis rocket",
+    "Heatwave hits Europe", "Election results live", "Amazon cuts jobs", "Google fined in EU",
+    "Bitcoin hits record high", "Storm batters Florida coast", "Netflix subscribers jump",
+    "Gaza ceasefire talks resume", "Microsoft beats estimates", "Boeing shares slide",
+    "UK inflation eases", "Nvidia earnings preview", "Man City win title", "Gold price climbs",
+]
+
+ARTICLES = [" ".join([title] * 80) for title in TITLES]
+
+def normalize(lang: str) -> str:
+    # langdetect reports Chinese variants as zh-cn / zh-tw
+    return lang.split("-")[0]
+
+def time_per_call(fn, inputs, repeat: int = 5) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in inputs:
+            fn(text)
+        samples.append((time.perf_counter() - start) / len(inputs))
+    return statistics.median(samples) * 1e6
+
+def main():
+    detect_language(TITLES[0])  # load the model before timing
+
+    def cold(text):
+        _detect_short.cache_clear()
+        return detect_language(text)
+
+    rows = [
+        ("langdetect, title", time_per_call(detect, TITLES)),
+        ("detect_language, title (uncached)", time_per_call(cold, TITLES)),
+        ("detect_language, title (cached)", time_per_call(detect_language, TITLES)),
+        ("detect_languages, page of 10 titles", time_per_call(detect_languages, [TITLES[:10], TITLES[10:]]) / 10),
+        ("langdetect, article", time_per_call(detect, ARTICLES, repeat=3)),
+        ("detect_language, article", time_per_call(detect_language, ARTICLES, repeat=3)),
+    ]
+    for name, micros in rows:
+        print(f"{name:<40} {micros:>10.1f} us/text")
+
+    reference = [normalize(detect(t)) for t in TITLES]
+    ours = detect_languages(TITLES)
+    agree = sum(1 for a, b in zip(reference, ours) if a == b)
+    print(f"\nAgreement with langdetect on titles: {agree}/{len(TITLES)}")
+    for text, a, b in zip(TITLES, reference, ours):
+        if a != b:
+            print(f"  langdetect={a} langid={b}: {text}")
+
+    reference = [normalize(detect(t)) for t in SHORT_EN_TITLES]
+    ours = [lang or "en" for lang in detect_languages(SHORT_EN_TITLES)]
+    print(f"\nShort English titles labelled as another language: "
+          f"langdetect {sum(lang != 'en' for lang in reference)}/{len(SHORT_EN_TITLES)}, "
+          f"langid {sum(lang != 'en' for lang in ours)}/{len(SHORT_EN_TITLES)}")
+    for text, a, b in zip(SHORT_EN_TITLES, reference, ours):
+        if a != "en" or b != "en":
+            print(f"  langdetect={a} langid={b}: {text}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Measures SERP parsing throughput in the request thread versus a process pool.
+
+Parsing (BeautifulSoup + dateparser) is CPU-bound and serialized by the GIL
+when done in threads, which is what PARSE_PROCESSES and multiple uvicorn
+workers are meant to get around.
+
+    PYTHONPATH=app python benchmarks/bench_parse.py [pages]
+
+The last lines simulate the gateway as deployed: WEB_CONCURRENCY worker
+processes parsing at the same time, each through its own PARSE_PROCESSES
+pool (or its request threads when 0), read from the environment like the
+service does:
+
+    WEB_CONCURRENCY=4 PARSE_PROCESSES=2 PYTHONPATH=app python benchmarks/bench_parse.py
+"""
+import os
+import sys
+import time
+import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from web.web_search import WebScraping
+
+DATES = ["Nov 23, 2025", "3 days ago", "12 Mar 2024", "2 hours ago", "Jan 5, 2023"]
+
+def build_page(page: int) -> str:
+    items = []
+    for i in range(10):
+        items.append(
+            f'<li class="b_algo"><h2><a href="https://example{i}.com/story/{page}-{i}">'
+            f"Story {page}-{i} about the markets and the economy</a></h2>"
+            f'<div class="b_caption"><div class="b_attribution">example{i}.com &#183; '
+            f"<span>{DATES[i % len(DATES)]}</span></div>"
+            f"<p>Snippet text for result {i} on page {page}, with a few more words to parse.</p></div></li>"
+        )
+        items.append(
+            f'<div class="news-card"><a class="title" href="https://news{i}.com/{page}-{i}">News {page}-{i}</a>'
+            f'<div class="snippet">News snippet {i}</div><span class="news_dt">{DATES[(i + 2) % len(DATES)]}</span></div>'
+        )
+    return "<html><body><ol>" + "".join(items) + "</ol></body></html>"
+
+def parse(html: str):
+    return WebScraping.extract_serp_items(html, "news")
+
+def usable_cores() -> int:
+    # cpu_count() reports the host, containers are often limited to fewer cores
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def run(executor, pages) -> float:
+    start = time.perf_counter()
+    list(executor.map(parse, pages))
+    return len(pages) / (time.perf_counter() - start)
+
+# Threads serving concurrent requests in one worker when PARSE_PROCESSES is 0
+REQUEST_THREADS = 4
+
+def gateway_worker(num_pages: int, parse_processes: int, barrier, results):
+    pages = [build_page(p) for p in range(num_pages)]
+    parse(pages[0])
+    if parse_processes:
+        executor = ProcessPoolExecutor(max_workers=parse_processes, mp_context=multiprocessing.get_context("spawn"))
+        list(executor.map(parse, pages[:parse_processes]))
+    else:
+        executor = ThreadPoolExecutor(max_workers=REQUEST_THREADS)
+    with executor:
+        # All workers start parsing together once they are warmed up
+        barrier.wait()
+        start = time.time()
+        list(executor.map(parse, pages))
+        results.put((start, time.time()))
+
+def gateway(num_pages: int, web_concurrency: int, parse_processes: int) -> float:
+    """
+    Aggregate pages/s of web_concurrency worker processes parsing num_pages each.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(web_concurrency)
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=gateway_worker, args=(num_pages, parse_processes, barrier, results))
+        for _ in range(web_concurrency)
+    ]
+    for worker in workers:
+        worker.start()
+    spans = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = max(end for _, end in spans) - min(start for start, _ in spans)
+    return num_pages * web_concurrency / elapsed
+
+def main():
+    num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    pages = [build_page(p) for p in range(num_pages)]
+    parse(pages[0])  # warm up dateparser
+    print(f"{platform.processor() or platform.machine()}, {usable_cores()} usable cores, Python {platform.python_version()}, {num_pages} pages")
+
+    start = time.perf_counter()
+    for html in pages:
+        parse(html)
+    print(f"{'serial':<20} {num_pages / (time.perf_counter() - start):>8.1f} pages/s")
+
+    cores = usable_cores()
+    with ThreadPoolExecutor(max_workers=cores) as executor:
+        print(f"{f'threads x{cores}':<20} {run(executor, pages):>8.1f} pages/s")
+
+    workers = 1
+    while workers <= cores:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+            list(executor.map(parse, pages[:workers]))  # start and warm up the processes
+            print(f"{f'processes x{workers}':<20} {run(executor, pages):>8.1f} pages/s")
+        workers *= 2
+
+    web_concurrency = int(os.getenv("WEB_CONCURRENCY", "1"))
+    parse_processes = int(os.getenv("PARSE_PROCESSES", "0"))
+    configs = [(1, 0)]
+    if (web_concurrency, parse_processes) != (1, 0):
+        configs.append((web_concurrency, parse_processes))
+    for concurrency, processes in configs:
+        name = f"gateway {concurrency}w x{processes}p"
+        print(f"{name:<20} {gateway(num_pages, concurrency, processes):>8.1f} pages/s")
+
+if __name__ == "__main__":
+    main()
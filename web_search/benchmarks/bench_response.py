@@ -0,0 +1,93 @@
+"""
+Compares building and serializing a search response the old way (dict per
+result, strftime/strptime dates, Pydantic validation + JSONResponse) with
+SearchResult records and orjson.
+
+    PYTHONPATH=app python benchmarks/bench_response.py [queries] [results_per_query]
+"""
+import sys
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from operator import attrgetter
+from typing import Any, Dict, List, Optional
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from web.results import SearchResult, dumps
+
+class CombinedResponse(BaseModel):
+    warning: Optional[str] = None
+    result: List[Dict[str, Any]]
+    oldest_result: Optional[Dict[str, Any]] = None
+
+BASE_DATE = datetime(2025, 11, 23)
+
+def raw_results(query: int, count: int):
+    for i in range(count):
+        translated = i % 3 == 0
+        yield (
+            f"Headline {i} for query {query} about the ongoing story",
+            f"https://news{i % 17}.example.com/{query}/{i}",
+            f"Snippet {i} with a couple of sentences of text describing the article for query {query}.",
+            BASE_DATE - timedelta(days=i * 7 + query),
+            "de" if translated else None,
+        )
+
+def build_dicts(num_queries: int, per_query: int) -> bytes:
+    queries, all_dated = [], []
+    for q in range(num_queries):
+        news = []
+        for title, url, snippet, date, lang in raw_results(q, per_query):
+            item = {"title": title, "url": url, "snippet": snippet, "date": date.strftime("%Y-%m-%d")}
+            if lang:
+                item["title"] = f"{title} (original language source: {lang})"
+                item["original_title"] = title
+                item["original_snippet"] = snippet
+                item["original_language"] = lang
+            news.append(item)
+        queries.append({"search_term": f"query {q}", "sentence": "...", "news_results": news, "website_results": []})
+        all_dated.extend(news)
+    oldest = min(all_dated, key=lambda x: datetime.strptime(x["date"], "%Y-%m-%d"))
+    response = CombinedResponse(warning=None, result=queries, oldest_result=oldest)
+    return json.dumps(jsonable_encoder(response), ensure_ascii=False, separators=(",", ":")).encode()
+
+def build_records(num_queries: int, per_query: int) -> bytes:
+    queries, all_dated = [], []
+    for q in range(num_queries):
+        news = []
+        for title, url, snippet, date, lang in raw_results(q, per_query):
+            item = SearchResult(title=title, url=url, snippet=snippet, date=date.date())
+            if lang:
+                item.original_title = title
+                item.original_snippet = snippet
+                item.original_language = lang
+            news.append(item)
+        queries.append({"search_term": f"query {q}", "sentence": "...", "news_results": news, "website_results": []})
+        all_dated.extend(news)
+    oldest = min(all_dated, key=attrgetter("date"), default=None)
+    return dumps({"warning": None, "result": queries, "oldest_result": oldest})
+
+def measure(fn, *args, repeat: int = 20):
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    body = fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 1024, len(body)
+
+def main():
+    num_queries = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    per_query = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(f"{num_queries} queries x {per_query} results")
+    for name, fn in [("dicts + pydantic", build_dicts), ("records + orjson", build_records)]:
+        ms, peak_kib, size = measure(fn, num_queries, per_query)
+        print(f"{name:<18} {ms:>8.2f} ms  peak {peak_kib:>8.1f} KiB  body {size / 1024:>7.1f} KiB")
+
+if __name__ == "__main__":
+    main()